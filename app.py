@@ -5,12 +5,87 @@ Streamlit app for climate anomaly detection.
 import streamlit as st
 import plotly.graph_objects as go
 from datetime import datetime
-from src.api_client import (
-    get_coordinates,
-    fetch_current_weather,
-    fetch_historical_climate,
+from src.api_client import HOURLY_METRICS, get_coordinates, snap_to_grid
+from src.api_client_async import fetch_weather_bundle
+from src.analysis import (
+    METRIC_COLUMNS,
+    analyze_climate_anomalies,
+    calendar_fields,
+    compute_seasonal_stats,
+    select_seasonal_data,
 )
-from src.analysis import analyze_climate_anomalies
+
+
+# Variables shown in the histogram section; enough for a quick look
+QUICK_LOOK_METRICS = ("temperature_2m", "relative_humidity_2m")
+
+# Years of archive history; also part of every cache key built from it
+YEARS_BACK = 10
+
+
+@st.cache_resource(ttl=3600)
+def load_seasonal_stats(latitude, longitude, years_back, metrics, _historical_data):
+    """Seasonal stats per location; the leading underscore skips hashing the DataFrame."""
+    return compute_seasonal_stats(_historical_data)
+
+
+@st.cache_data(ttl=3600)
+def load_seasonal_values(
+    latitude, longitude, years_back, metrics, column_name, month, hour, _historical_data
+):
+    """Seasonal slice for the histogram, keyed on location like load_seasonal_stats."""
+    return select_seasonal_data(
+        _historical_data[column_name],
+        month,
+        hour,
+        calendar_fields(_historical_data),
+    ).to_numpy()
+
+
+@st.cache_data(ttl=3600)
+def build_histogram(seasonal_values, current, mean, label, unit, month, hour):
+    """
+    Builds the historical distribution figure.
+    
+    Takes a plain numpy array rather than the DataFrame so Streamlit hashes
+    and copies as little as possible on each rerun.
+    """
+    fig = go.Figure()
+    
+    fig.add_trace(
+        go.Histogram(
+            x=seasonal_values,
+            nbinsx=30,
+            name="Historical Distribution",
+            marker_color="lightblue",
+        )
+    )
+    
+    fig.add_vline(
+        x=current,
+        line_dash="dash",
+        line_color="red",
+        annotation_text=f"Current: {current:.1f}",
+        annotation_position="top",
+    )
+    
+    fig.add_vline(
+        x=mean,
+        line_dash="dot",
+        line_color="green",
+        annotation_text=f"Mean: {mean:.1f}",
+        annotation_position="top",
+    )
+    
+    fig.update_layout(
+        title=f"Historical Distribution for {label} (Month {month}, Hour {hour})",
+        xaxis_title=f"{label} ({unit})",
+        yaxis_title="Frequency",
+        height=400,
+    )
+    
+    return fig
+
 
 st.set_page_config(
     page_title="Climate Anomaly Detector",
@@ -20,11 +95,11 @@ st.set_page_config(
 
 st.title("🌡️ Climate Anomaly Detector")
 st.markdown(
-    """
+    f"""
     **Statistical dashboard using ERA5 reanalysis data to detect climate anomalies.**
     
     Standard weather apps don't provide climate context. This tool compares current 
-    conditions against 10 years of historical data to identify statistically significant anomalies.
+    conditions against {YEARS_BACK} years of historical data to identify statistically significant anomalies.
     """
 )
 
@@ -36,15 +111,22 @@ city_name = st.sidebar.text_input(
     help="Enter a city name (e.g., 'New York', 'London', 'Tokyo')",
 )
 
+quick_look = st.sidebar.checkbox(
+    "⚡ Quick Look",
+    value=False,
+    help="Only download temperature and humidity history for a faster first result",
+)
+archive_metrics = QUICK_LOOK_METRICS if quick_look else HOURLY_METRICS
+
 st.sidebar.markdown("---")
 st.sidebar.markdown("### 📊 About")
 st.sidebar.markdown(
-    """
+    f"""
     This dashboard uses:
     - **Z-Score Statistics** for anomaly detection
     - **Seasonal Decomposition** to account for monthly/hourly patterns
     - **ERA5 Reanalysis Data** from Open-Meteo API
-    - **10-Year Historical Baseline** for accurate comparisons
+    - **{YEARS_BACK}-Year Historical Baseline** for accurate comparisons
     """
 )
 
@@ -56,9 +138,12 @@ if st.sidebar.button("🔍 Analyze Climate", type="primary") or city_name:
             st.error(f"❌ Could not find city '{city_name}'. Please check the spelling and try again.")
         else:
             latitude, longitude = coords
+            # Cache per ERA5 grid cell so nearby cities share downloads
+            grid_latitude, grid_longitude = snap_to_grid(latitude), snap_to_grid(longitude)
             
-            current_weather = fetch_current_weather(latitude, longitude)
-            historical_data = fetch_historical_climate(latitude, longitude, years_back=10)
+            current_weather, historical_data = fetch_weather_bundle(
+                grid_latitude, grid_longitude, years_back=YEARS_BACK, metrics=archive_metrics
+            )
             
             if current_weather is None:
                 st.error("❌ Failed to fetch current weather data. Please try again later.")
@@ -67,7 +152,12 @@ if st.sidebar.button("🔍 Analyze Climate", type="primary") or city_name:
             else:
                 st.success(f"✅ Analyzing climate for: **{city_name}** ({latitude:.2f}°, {longitude:.2f}°)")
                 
-                anomalies = analyze_climate_anomalies(current_weather, historical_data)
+                seasonal_stats = load_seasonal_stats(
+                    grid_latitude, grid_longitude, YEARS_BACK, archive_metrics, historical_data
+                )
+                anomalies = analyze_climate_anomalies(
+                    current_weather, historical_data, seasonal_stats
+                )
                 
                 if not anomalies:
                     st.warning("⚠️ Could not perform analysis. Historical data may be incomplete.")
@@ -161,59 +251,29 @@ if st.sidebar.button("🔍 Analyze Climate", type="primary") or city_name:
                                     month = current_time.month
                                     hour = current_time.hour
                                     
-                                    column_name = {
-                                        "temperature": "temperature_2m",
-                                        "humidity": "relative_humidity_2m",
-                                        "precipitation": "precipitation",
-                                        "wind_speed": "wind_speed_10m",
-                                    }[metric_key]
+                                    column_name = METRIC_COLUMNS[metric_key]
                                     
                                     if column_name in historical_data.columns:
-                                        seasonal_filter = (
-                                            (historical_data.index.month == month)
-                                            & (historical_data.index.hour == hour)
+                                        seasonal_values = load_seasonal_values(
+                                            grid_latitude,
+                                            grid_longitude,
+                                            YEARS_BACK,
+                                            archive_metrics,
+                                            column_name,
+                                            month,
+                                            hour,
+                                            historical_data,
                                         )
-                                        seasonal_data = historical_data[seasonal_filter][column_name].dropna()
-                                        
-                                        if seasonal_data.empty:
-                                            seasonal_data = historical_data[
-                                                historical_data.index.month == month
-                                            ][column_name].dropna()
                                         
-                                        if not seasonal_data.empty:
-                                            fig = go.Figure()
-                                            
-                                            fig.add_trace(
-                                                go.Histogram(
-                                                    x=seasonal_data,
-                                                    nbinsx=30,
-                                                    name="Historical Distribution",
-                                                    marker_color="lightblue",
-                                                )
-                                            )
-                                            
-                                            fig.add_vline(
-                                                x=data["current"],
-                                                line_dash="dash",
-                                                line_color="red",
-                                                annotation_text=f"Current: {data['current']:.1f}",
-                                                annotation_position="top",
-                                            )
-                                            
-                                            fig.add_vline(
-                                                x=data["mean"],
-                                                line_dash="dot",
-                                                line_color="green",
-                                                annotation_text=f"Mean: {data['mean']:.1f}",
-                                                annotation_position="top",
-                                            )
-                                            
-                                            fig.update_layout(
-                                                title=f"Historical Distribution for {metric_names[metric_key]} "
-                                                f"(Month {month}, Hour {hour})",
-                                                xaxis_title=f"{metric_names[metric_key]} ({units[metric_key]})",
-                                                yaxis_title="Frequency",
-                                                height=400,
+                                        if seasonal_values.size > 0:
+                                            fig = build_histogram(
+                                                seasonal_values,
+                                                data["current"],
+                                                data["mean"],
+                                                metric_names[metric_key],
+                                                units[metric_key],
+                                                month,
+                                                hour,
                                             )
                                             
                                             st.plotly_chart(fig, use_container_width=True)
@@ -0,0 +1,76 @@
+"""
+Compiled kernels for the seasonal Z-score path.
+Uses numba when installed and falls back to numpy/bottleneck otherwise.
+"""
+
+import bottleneck as bn
+import numpy as np
+from typing import Tuple
+
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+
+def _seasonal_mean_std_numpy(
+    values: np.ndarray, months: np.ndarray, hours: np.ndarray, month: int, hour: int
+) -> Tuple[float, float, int, int]:
+    """Reference implementation of seasonal_mean_std using boolean masks."""
+    mask = np.ones(values.shape[0], dtype=bool)
+    if month >= 0:
+        mask &= months == month
+    if hour >= 0:
+        mask &= hours == hour
+    
+    # float64 like the compiled loop; bottleneck would accumulate float32 in float32
+    selected = values[mask].astype(np.float64)
+    n_rows = selected.shape[0]
+    n_valid = int(np.count_nonzero(~np.isnan(selected)))
+    
+    if n_valid == 0:
+        return 0.0, 0.0, 0, n_rows
+    
+    mean = float(bn.nanmean(selected))
+    std_dev = float(bn.nanstd(selected, ddof=1)) if n_valid > 1 else 0.0
+    return mean, std_dev, n_valid, n_rows
+
+
+def _seasonal_mean_std_loop(values, months, hours, month, hour):
+    """
+    Returns (mean, std, valid count, row count) of values in one month/hour slot.
+    
+    Fuses the month/hour mask, NaN skip and mean/std (ddof=1) reduction into
+    a single pass. A month or hour of -1 matches every row. The std is 0.0
+    when fewer than two values are valid.
+    """
+    n_rows = 0
+    n_valid = 0
+    mean = 0.0
+    m2 = 0.0
+    
+    for i in range(values.shape[0]):
+        if (month < 0 or months[i] == month) and (hour < 0 or hours[i] == hour):
+            n_rows += 1
+            v = float(values[i])  # accumulate in float64 for float32 input
+            if v == v:  # skips NaN
+                # Welford's update: one pass, numerically stable
+                n_valid += 1
+                delta = v - mean
+                mean += delta / n_valid
+                m2 += delta * (v - mean)
+    
+    if n_valid == 0:
+        return 0.0, 0.0, 0, n_rows
+    if n_valid < 2:
+        return mean, 0.0, n_valid, n_rows
+    return mean, np.sqrt(m2 / (n_valid - 1)), n_valid, n_rows
+
+
+if njit is not None:
+    # No "nnan" fast-math flag: it would let LLVM drop the NaN check above
+    seasonal_mean_std = njit(cache=True, fastmath={"contract", "arcp", "nsz"})(
+        _seasonal_mean_std_loop
+    )
+else:
+    seasonal_mean_std = _seasonal_mean_std_numpy
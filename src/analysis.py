@@ -5,49 +5,243 @@ Filters historical data by month/hour to account for seasonality.
 
 import pandas as pd
 import numpy as np
-from typing import Dict, Optional, Tuple
+from typing import Dict, List, Optional, Tuple, Union
 from datetime import datetime
 
 
+METRIC_COLUMNS = {
+    "temperature": "temperature_2m",
+    "humidity": "relative_humidity_2m",
+    "precipitation": "precipitation",
+    "wind_speed": "wind_speed_10m",
+}
+
+SEVERITY_LABELS = ("Normal", "Moderate", "Extreme")
+_SEVERITY_STEPS = np.array([1.0, 2.0])
+
+
+def calendar_fields(
+    historical_data: Union[pd.DataFrame, pd.Series, np.ndarray]
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Returns month and hour arrays for the historical index.
+    
+    Reuses the int8 _month/_hour columns attached by the API client when
+    present; pandas rebuilds DatetimeIndex.month/.hour on every access.
+    A datetime64 array is treated as the index itself.
+    """
+    if isinstance(historical_data, np.ndarray):
+        months = historical_data.astype("datetime64[M]").astype(np.int64) % 12 + 1
+        hours = (
+            historical_data.astype("datetime64[h]") - historical_data.astype("datetime64[D]")
+        ).astype(np.int64)
+        return months.astype(np.int8), hours.astype(np.int8)
+    
+    if isinstance(historical_data, pd.DataFrame) and "_month" in historical_data.columns:
+        return historical_data["_month"].to_numpy(), historical_data["_hour"].to_numpy()
+    
+    index = historical_data.index
+    return index.month.to_numpy().astype(np.int8), index.hour.to_numpy().astype(np.int8)
+
+
+def month_hour_key(month: int, hour: int) -> int:
+    """Packs month and hour into one group key, e.g. January 13:00 -> 113."""
+    return month * 100 + hour
+
+
+def month_hour_groups(historical_data: pd.DataFrame) -> pd.Categorical:
+    """
+    Returns the packed (month, hour) key of every row as a Categorical.
+    
+    Reuses the _month_hour column attached by the API client when present.
+    """
+    if "_month_hour" in historical_data.columns:
+        return historical_data["_month_hour"].array
+    
+    months, hours = calendar_fields(historical_data)
+    return pd.Categorical(month_hour_key(months.astype(np.int16), hours))
+
+
+def select_seasonal_data(
+    historical_data: pd.Series,
+    month: int,
+    hour: int,
+    calendar: Optional[Tuple[np.ndarray, np.ndarray]] = None,
+) -> pd.Series:
+    """
+    Returns historical values matching the given month and hour.
+    
+    Falls back to the whole month, then to all data, when there is no match.
+    Pass calendar from calendar_fields to avoid recomputing it per call.
+    """
+    months, hours = calendar if calendar is not None else calendar_fields(historical_data)
+    month_filter = months == month
+    
+    seasonal_data = historical_data[month_filter & (hours == hour)]
+    
+    if seasonal_data.empty:
+        seasonal_data = historical_data[month_filter]
+    
+    if seasonal_data.empty:
+        seasonal_data = historical_data
+    
+    return seasonal_data.dropna()
+
+
+def compute_seasonal_stats(historical_data: pd.DataFrame) -> Dict[str, pd.DataFrame]:
+    """
+    Precomputes mean, std and size for every metric column, grouped by
+    (month, hour) (keyed by month_hour_key), by month alone and over the
+    whole record.
+    
+    Each table has one row per group and (column, statistic) columns, so
+    looking up a metric for the current time is a single index access
+    instead of a boolean-mask scan over the full history.
+    """
+    columns = [c for c in METRIC_COLUMNS.values() if c in historical_data.columns]
+    if not columns:
+        return {}
+    
+    data = historical_data[columns]
+    months, _ = calendar_fields(historical_data)
+    # size counts rows (NaN included), matching calculate_z_score's fallback
+    stats = ["mean", "std", "size"]
+    
+    # Categorical keys let pandas reuse its group codes instead of hashing
+    month_hour = month_hour_groups(historical_data)
+    
+    return {
+        "month_hour": data.groupby(month_hour, observed=True, sort=False).agg(stats),
+        "month": data.groupby(months).agg(stats),
+        # Single group (key 0) so every level shares the same layout
+        "overall": data.groupby(np.zeros(len(data), dtype=int)).agg(stats),
+    }
+
+
+def _seasonal_moments(
+    seasonal_stats: Dict[str, pd.DataFrame],
+    columns: List[str],
+    month: int,
+    hour: int,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Looks up seasonal mean and std for several columns at once.
+    
+    Each column falls back independently: same month and hour, then same
+    month, then all data. Like calculate_z_score, a level is used as soon
+    as it has rows, so a slot whose values are all NaN gets 0.0 for both.
+    """
+    means = np.zeros(len(columns))
+    std_devs = np.zeros(len(columns))
+    found = np.zeros(len(columns), dtype=bool)
+    
+    lookups = (
+        ("month_hour", month_hour_key(month, hour)),
+        ("month", month),
+        ("overall", 0),
+    )
+    
+    for level, key in lookups:
+        table = seasonal_stats[level]
+        if key not in table.index:
+            continue
+        
+        sizes = table.loc[key, [(c, "size") for c in columns]].to_numpy()
+        use = ~found & (sizes > 0)
+        means[use] = table.loc[key, [(c, "mean") for c in columns]].to_numpy()[use]
+        std_devs[use] = table.loc[key, [(c, "std") for c in columns]].to_numpy()[use]
+        found |= use
+        
+        if found.all():
+            break
+    
+    # An all-NaN slot has a NaN mean; a single sample has a NaN std
+    means = np.nan_to_num(means, nan=0.0)
+    std_devs = np.nan_to_num(std_devs, nan=0.0)
+    
+    return means, std_devs
+
+
+def seasonal_z_score(
+    current_value: float,
+    seasonal_stats: Dict[str, pd.DataFrame],
+    column_name: str,
+    month: int,
+    hour: int,
+) -> Tuple[float, float, float]:
+    """
+    Calculates Z-score from precomputed seasonal statistics.
+    
+    Uses the same fallback order as calculate_z_score: same month and hour,
+    then same month, then all data.
+    """
+    means, std_devs = _seasonal_moments(seasonal_stats, [column_name], month, hour)
+    mean = float(means[0])
+    std_dev = float(std_devs[0])
+    
+    if std_dev == 0:
+        z_score = 0.0
+    else:
+        z_score = (current_value - mean) / std_dev
+    
+    return z_score, mean, std_dev
+
+
 def calculate_z_score(
     current_value: float,
-    historical_data: pd.Series,
+    historical_data: Union[pd.Series, np.ndarray],
     current_datetime: datetime,
+    calendar: Optional[Tuple[np.ndarray, np.ndarray]] = None,
+    index: Optional[np.ndarray] = None,
 ) -> Tuple[float, float, float]:
     """
     Calculates Z-score for anomaly detection.
     
     Filters historical data to match current month and hour to handle
     seasonal patterns (e.g., comparing January temps to January, not July).
+    historical_data may be a plain array when calendar or index (a
+    DatetimeIndex or datetime64 array) is given, which skips building a
+    Series for small inputs.
     """
-    if historical_data.empty:
+    if len(historical_data) == 0:
         return 0.0, 0.0, 0.0
     
-    month = current_datetime.month
-    hour = current_datetime.hour
+    if calendar is None:
+        if index is None and isinstance(historical_data, np.ndarray):
+            raise ValueError("index or calendar is required for array historical_data")
+        if index is None:
+            calendar = calendar_fields(historical_data)
+        else:
+            # Accepts a DatetimeIndex or any datetime64 array-like
+            calendar = calendar_fields(np.asarray(index, dtype="datetime64[ns]"))
     
-    # Filter to same month and hour
-    seasonal_filter = (historical_data.index.month == month) & (
-        historical_data.index.hour == hour
-    )
-    seasonal_data = historical_data[seasonal_filter]
+    # Imported here so loading the app (which scores via compute_seasonal_stats)
+    # does not pay numba's import cost
+    from ._fast import seasonal_mean_std
     
-    # Fallback to same month only if no exact match
-    if seasonal_data.empty:
-        seasonal_filter = historical_data.index.month == month
-        seasonal_data = historical_data[seasonal_filter]
+    months, hours = calendar
+    values = np.asarray(historical_data)
+    if values.dtype.kind != "f":
+        values = values.astype(np.float64)
     
-    # Last resort: use all data
-    if seasonal_data.empty:
-        seasonal_data = historical_data
-    
-    seasonal_data = seasonal_data.dropna()
+    # Same fallback order as select_seasonal_data: month+hour, month, all data
+    # (-1 matches any month/hour in the kernel)
+    for month, hour in (
+        (current_datetime.month, current_datetime.hour),
+        (current_datetime.month, -1),
+        (-1, -1),
+    ):
+        mean, std_dev, n_valid, n_rows = seasonal_mean_std(
+            values, months, hours, month, hour
+        )
+        if n_rows > 0:
+            break
     
-    if len(seasonal_data) == 0:
+    if n_valid == 0:
         return 0.0, 0.0, 0.0
     
-    mean = float(seasonal_data.mean())
-    std_dev = float(seasonal_data.std())
+    mean = float(mean)
+    std_dev = float(std_dev)
     
     if std_dev == 0:
         z_score = 0.0
@@ -57,59 +251,75 @@ def calculate_z_score(
     return z_score, mean, std_dev
 
 
+def severity_levels(z_scores: np.ndarray, threshold: float = 2.0) -> np.ndarray:
+    """
+    Maps Z-scores to severity indexes into SEVERITY_LABELS.
+    
+    |Z| >= threshold is Moderate and |Z| >= 2 * threshold is Extreme; one
+    searchsorted call classifies a whole array without branching. NaN
+    scores count as Normal.
+    """
+    abs_z = np.nan_to_num(np.abs(z_scores), nan=0.0)
+    return np.searchsorted(threshold * _SEVERITY_STEPS, abs_z, side="right")
+
+
 def detect_anomaly(z_score: float, threshold: float = 2.0) -> Tuple[bool, str]:
     """Classifies Z-score as normal or anomaly with severity level."""
-    abs_z = abs(z_score)
-    
-    if abs_z >= threshold * 2:
-        return True, "Extreme"
-    elif abs_z >= threshold:
-        return True, "Moderate"
-    else:
-        return False, "Normal"
+    level = int(severity_levels(z_score, threshold))
+    return level > 0, SEVERITY_LABELS[level]
 
 
 def analyze_climate_anomalies(
     current_weather: Dict,
     historical_data: pd.DataFrame,
+    seasonal_stats: Optional[Dict[str, pd.DataFrame]] = None,
 ) -> Dict[str, Dict]:
-    """Runs anomaly analysis for all climate metrics."""
+    """
+    Runs anomaly analysis for all climate metrics.
+    
+    Pass seasonal_stats from compute_seasonal_stats to reuse tables that
+    were already built for this historical data.
+    """
     if historical_data is None or historical_data.empty:
         return {}
     
+    if seasonal_stats is None:
+        seasonal_stats = compute_seasonal_stats(historical_data)
+    
     current_time = datetime.now()
-    results = {}
     
-    metrics = {
-        "temperature": "temperature_2m",
-        "humidity": "relative_humidity_2m",
-        "precipitation": "precipitation",
-        "wind_speed": "wind_speed_10m",
-    }
+    metric_names = [
+        metric_name
+        for metric_name, column_name in METRIC_COLUMNS.items()
+        if column_name in historical_data.columns
+        and current_weather.get(metric_name) is not None
+    ]
+    if not metric_names:
+        return {}
     
-    for metric_name, column_name in metrics.items():
-        if column_name not in historical_data.columns:
-            continue
-        
-        current_value = current_weather.get(metric_name)
-        if current_value is None:
-            continue
-        
-        historical_series = historical_data[column_name]
-        
-        z_score, mean, std_dev = calculate_z_score(
-            current_value, historical_series, current_time
-        )
-        
-        is_anomaly, severity = detect_anomaly(z_score)
-        
+    # All metrics are scored in one vectorized pass
+    current = np.array([current_weather[m] for m in metric_names], dtype=np.float64)
+    means, std_devs = _seasonal_moments(
+        seasonal_stats,
+        [METRIC_COLUMNS[m] for m in metric_names],
+        current_time.month,
+        current_time.hour,
+    )
+    z_scores = np.divide(
+        current - means, std_devs, out=np.zeros_like(current), where=std_devs > 0
+    )
+    
+    levels = severity_levels(z_scores)
+    results = {}
+    
+    for i, metric_name in enumerate(metric_names):
         results[metric_name] = {
-            "current": current_value,
-            "mean": mean,
-            "std_dev": std_dev,
-            "z_score": z_score,
-            "is_anomaly": is_anomaly,
-            "severity": severity,
+            "current": current_weather[metric_name],
+            "mean": float(means[i]),
+            "std_dev": float(std_devs[i]),
+            "z_score": float(z_scores[i]),
+            "is_anomaly": bool(levels[i] > 0),
+            "severity": SEVERITY_LABELS[levels[i]],
         }
     
     return results
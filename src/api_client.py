@@ -3,10 +3,25 @@ Fetches weather and climate data from Open-Meteo API.
 All APIs are free - no keys needed.
 """
 
+import hashlib
+import io
+import json
+import os
+import tempfile
+import time
+import numpy as np
 import pandas as pd
 import requests
+from pathlib import Path
 from typing import Dict, Optional, Tuple
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta, timezone
+
+# orjson decodes large archive payloads several times faster than json
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
 
 # Handle streamlit import for when running tests
 try:
@@ -22,92 +37,272 @@ except ImportError:
             def decorator(func):
                 return func
             return decorator
+        
+        cache_resource = cache_data
     
     st = MockStreamlit()
 
 
-@st.cache_data(ttl=3600)
-def fetch_current_weather(
-    latitude: float, longitude: float
-) -> Optional[Dict]:
-    """Gets current weather for a location."""
-    try:
-        url = "https://api.open-meteo.com/v1/forecast"
-        params = {
-            "latitude": latitude,
-            "longitude": longitude,
-            "current": "temperature_2m,relative_humidity_2m,precipitation,wind_speed_10m",
-            "timezone": "auto",
+FORECAST_URL = "https://api.open-meteo.com/v1/forecast"
+ARCHIVE_URL = "https://archive-api.open-meteo.com/v1/era5"
+GEOCODING_URL = "https://geocoding-api.open-meteo.com/v1/search"
+
+CLIMATE_VARIABLES = "temperature_2m,relative_humidity_2m,precipitation,wind_speed_10m"
+HOURLY_METRICS = tuple(CLIMATE_VARIABLES.split(","))
+
+# ERA5 grid spacing; nearby locations share one grid cell (and cache entry)
+ERA5_GRID_DEGREES = 0.25
+
+# Archive CSV starts with a location metadata header, its values and a blank line
+CSV_METADATA_ROWS = 3
+
+# Shared session so repeated calls to *.open-meteo.com reuse TCP/TLS connections
+_SESSION = requests.Session()
+_SESSION.mount(
+    "https://",
+    requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=4, max_retries=1),
+)
+
+# On-disk archive cache; survives app restarts unlike st.cache_data
+CACHE_DIR = Path.home() / ".cache" / "climate_anomaly"
+ARCHIVE_CACHE_TTL = 86400
+
+
+def snap_to_grid(value: float) -> float:
+    """Rounds a latitude or longitude to the nearest ERA5 grid point."""
+    return round(value / ERA5_GRID_DEGREES) * ERA5_GRID_DEGREES
+
+
+def _current_params(latitude: float, longitude: float) -> Dict:
+    """Builds query parameters for the forecast endpoint."""
+    return {
+        "latitude": latitude,
+        "longitude": longitude,
+        "current": CLIMATE_VARIABLES,
+        "timezone": "auto",
+    }
+
+
+def _parse_current(data: Dict) -> Optional[Dict]:
+    """Extracts current conditions from a forecast response."""
+    if "current" in data:
+        return {
+            "temperature": data["current"]["temperature_2m"],
+            "humidity": data["current"]["relative_humidity_2m"],
+            "precipitation": data["current"]["precipitation"],
+            "wind_speed": data["current"]["wind_speed_10m"],
+            "timestamp": data["current"]["time"],
         }
-        
-        response = requests.get(url, params=params, timeout=10)
-        response.raise_for_status()
-        data = response.json()
-        
-        if "current" in data:
-            return {
-                "temperature": data["current"]["temperature_2m"],
-                "humidity": data["current"]["relative_humidity_2m"],
-                "precipitation": data["current"]["precipitation"],
-                "wind_speed": data["current"]["wind_speed_10m"],
-                "timestamp": data["current"]["time"],
-            }
-        return None
-    except requests.exceptions.RequestException as e:
-        st.error(f"Error fetching current weather: {str(e)}")
-        return None
-    except KeyError as e:
-        st.error(f"Unexpected API response format: {str(e)}")
-        return None
+    return None
 
 
-@st.cache_data(ttl=86400)
-def fetch_historical_climate(
-    latitude: float, longitude: float, years_back: int = 10
+def _archive_window(
+    years_back: int, today: Optional[date] = None
+) -> Tuple[date, date]:
+    """
+    Returns the (start, end) dates of the archive request.
+    
+    The window ends yesterday (UTC) and starts the same calendar day
+    years_back years earlier, so the request is identical for a whole day.
+    """
+    if today is None:
+        today = datetime.now(timezone.utc).date()
+    
+    end_date = today - timedelta(days=1)
+    try:
+        start_date = end_date.replace(year=end_date.year - years_back)
+    except ValueError:
+        # Feb 29 has no counterpart in a non-leap start year
+        start_date = end_date.replace(year=end_date.year - years_back, day=28)
+    
+    return start_date, end_date
+
+
+def _historical_params(
+    latitude: float,
+    longitude: float,
+    years_back: int,
+    metrics: Tuple[str, ...] = HOURLY_METRICS,
+) -> Dict:
+    """Builds query parameters for the ERA5 archive endpoint."""
+    start_date, end_date = _archive_window(years_back)
+    
+    return {
+        "latitude": latitude,
+        "longitude": longitude,
+        "start_date": start_date.strftime("%Y-%m-%d"),
+        "end_date": end_date.strftime("%Y-%m-%d"),
+        "hourly": ",".join(metrics),
+        "timezone": "auto",
+    }
+
+
+def _parse_historical(
+    data: Dict, metrics: Tuple[str, ...] = HOURLY_METRICS
 ) -> Optional[pd.DataFrame]:
-    """Fetches historical climate data from ERA5 reanalysis."""
+    """
+    Builds a time-indexed DataFrame from an archive response.
+    
+    Columns are stored as float32, which is plenty of precision for Z-score
+    statistics and halves memory compared to the inferred float64.
+    """
+    if "hourly" in data:
+        hourly = data["hourly"]
+        # numpy parses the fixed "YYYY-MM-DDTHH:MM" form in C, no format inference
+        times = np.asarray(hourly["time"], dtype="datetime64[m]")
+        df = pd.DataFrame(
+            {
+                column: np.asarray(hourly[column], dtype=np.float32)
+                for column in metrics
+            },
+            index=pd.DatetimeIndex(times.astype("datetime64[ns]"), name="time"),
+        )
+        return _add_calendar_fields(df)
+    
+    return None
+
+
+def _parse_historical_csv(
+    content: bytes, metrics: Tuple[str, ...] = HOURLY_METRICS
+) -> pd.DataFrame:
+    """
+    Builds a time-indexed DataFrame from an archive response in CSV format.
+    
+    The parser writes straight into float32 columns, skipping the
+    intermediate Python lists that a JSON response decodes into.
+    """
+    df = pd.read_csv(
+        io.BytesIO(content),
+        skiprows=CSV_METADATA_ROWS,
+        header=0,
+        # Replaces the unit-suffixed header, e.g. "temperature_2m (°C)"
+        names=["time", *metrics],
+        dtype=dict.fromkeys(metrics, np.float32),
+        parse_dates=["time"],
+        date_format="%Y-%m-%dT%H:%M",
+        index_col="time",
+    )
+    return _add_calendar_fields(df)
+
+
+def _add_calendar_fields(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Attaches cached month/hour columns (see analysis.calendar_fields) and
+    the packed month * 100 + hour group key as a Categorical.
+    """
+    df["_month"] = df.index.month.astype(np.int8)
+    df["_hour"] = df.index.hour.astype(np.int8)
+    df["_month_hour"] = pd.Categorical(
+        df["_month"].to_numpy(np.int16) * 100 + df["_hour"].to_numpy(np.int16)
+    )
+    return df
+
+
+def _archive_cache_path(
+    latitude: float,
+    longitude: float,
+    years_back: int,
+    metrics: Tuple[str, ...] = HOURLY_METRICS,
+) -> Path:
+    """Returns the Parquet file holding the archive for a location."""
+    key = hashlib.blake2b(
+        f"{latitude:.3f}_{longitude:.3f}_{years_back}_{','.join(metrics)}".encode()
+    ).hexdigest()[:16]
+    return CACHE_DIR / f"{key}.parquet"
+
+
+def _load_cached_archive(path: Path) -> Optional[pd.DataFrame]:
+    """Reads a cached archive if it exists and is younger than the TTL."""
     try:
-        end_date = datetime.now()
-        start_date = end_date - timedelta(days=365 * years_back)
-        
-        url = "https://archive-api.open-meteo.com/v1/era5"
-        params = {
-            "latitude": latitude,
-            "longitude": longitude,
-            "start_date": start_date.strftime("%Y-%m-%d"),
-            "end_date": end_date.strftime("%Y-%m-%d"),
-            "hourly": "temperature_2m,relative_humidity_2m,precipitation,wind_speed_10m",
-            "timezone": "auto",
-        }
-        
-        response = requests.get(url, params=params, timeout=30)
-        response.raise_for_status()
-        data = response.json()
-        
-        if "hourly" in data:
-            df = pd.DataFrame(data["hourly"])
-            df["time"] = pd.to_datetime(df["time"])
-            df = df.set_index("time")
+        if time.time() - path.stat().st_mtime < ARCHIVE_CACHE_TTL:
+            df = pd.read_parquet(path)
+            # Parquet round-trips integer categoricals as plain integers
+            if "_month_hour" in df.columns:
+                df["_month_hour"] = df["_month_hour"].astype("category")
             return df
-        
-        return None
-    except requests.exceptions.RequestException as e:
-        st.error(f"Error fetching historical climate data: {str(e)}")
-        return None
-    except (KeyError, ValueError) as e:
-        st.error(f"Error processing historical data: {str(e)}")
-        return None
+        # Expired - remove it so the directory doesn't grow with every location
+        path.unlink(missing_ok=True)
+    except (OSError, ImportError, ValueError):
+        # Missing, unreadable or corrupt file - fall through to the API
+        pass
+    return None
+
+
+def _store_cached_archive(df: pd.DataFrame, path: Path) -> None:
+    """Writes an archive to the disk cache. Failures are not fatal."""
+    tmp_path = None
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Unique per writer; Streamlit sessions are threads sharing one pid
+        fd, tmp_name = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        os.close(fd)
+        tmp_path = Path(tmp_name)
+        df.to_parquet(tmp_path, compression="zstd")
+        tmp_path.replace(path)
+    except (OSError, ImportError, ValueError):
+        if tmp_path is not None:
+            tmp_path.unlink(missing_ok=True)
+
+
+def _parse_current_response(response) -> Optional[Dict]:
+    """
+    Checks a forecast response and extracts current conditions.
+    
+    Takes an httpx response from api_client_async; only status_code,
+    content and raise_for_status are used.
+    """
+    response.raise_for_status()
+    return _parse_current(_json_loads(response.content))
+
+
+def _archive_request(
+    latitude: float,
+    longitude: float,
+    years_back: int,
+    metrics: Tuple[str, ...] = HOURLY_METRICS,
+) -> Tuple[Optional[pd.DataFrame], Path, Dict]:
+    """
+    Returns (cached archive or None, cache path, JSON query parameters).
+    
+    The caller first requests the archive with {**params, "format": "csv"}
+    and falls back to params alone when _csv_rejected says so.
+    """
+    cache_path = _archive_cache_path(latitude, longitude, years_back, metrics)
+    params = _historical_params(latitude, longitude, years_back, metrics)
+    return _load_cached_archive(cache_path), cache_path, params
+
+
+def _csv_rejected(response) -> bool:
+    """Returns True when the archive refused format=csv with a client error."""
+    return 400 <= response.status_code < 500
+
+
+def _parse_archive_response(
+    response,
+    as_csv: bool,
+    cache_path: Path,
+    metrics: Tuple[str, ...] = HOURLY_METRICS,
+) -> Optional[pd.DataFrame]:
+    """Checks, parses and disk-caches an archive response."""
+    response.raise_for_status()
+    if as_csv:
+        df = _parse_historical_csv(response.content, metrics)
+    else:
+        df = _parse_historical(_json_loads(response.content), metrics)
+    
+    if df is not None:
+        _store_cached_archive(df, cache_path)
+    return df
 
 
 def get_coordinates(city_name: str) -> Optional[Tuple[float, float]]:
     """Converts city name to lat/lon coordinates."""
     try:
-        url = "https://geocoding-api.open-meteo.com/v1/search"
         params = {"name": city_name, "count": 1, "language": "en", "format": "json"}
         
-        response = requests.get(url, params=params, timeout=10)
+        response = _SESSION.get(GEOCODING_URL, params=params, timeout=10)
         response.raise_for_status()
-        data = response.json()
+        data = _json_loads(response.content)
         
         if "results" in data and len(data["results"]) > 0:
             result = data["results"][0]
@@ -117,6 +312,6 @@ def get_coordinates(city_name: str) -> Optional[Tuple[float, float]]:
     except requests.exceptions.RequestException as e:
         st.error(f"Error geocoding city '{city_name}': {str(e)}")
         return None
-    except (KeyError, IndexError) as e:
+    except (KeyError, IndexError, ValueError) as e:
         st.error(f"City '{city_name}' not found. Please check the spelling.")
         return None
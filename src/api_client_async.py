@@ -0,0 +1,105 @@
+"""
+Concurrent Open-Meteo requests using httpx.
+Fetches current weather and the ERA5 archive in parallel once coordinates are known.
+"""
+
+import asyncio
+import httpx
+import pandas as pd
+from typing import Dict, Optional, Tuple
+
+from .api_client import (
+    ARCHIVE_URL,
+    FORECAST_URL,
+    HOURLY_METRICS,
+    _archive_request,
+    _csv_rejected,
+    _current_params,
+    _parse_archive_response,
+    _parse_current_response,
+    st,
+)
+
+
+async def _fetch_current(
+    client: httpx.AsyncClient, latitude: float, longitude: float
+) -> Optional[Dict]:
+    """Gets current weather for a location."""
+    try:
+        response = await client.get(
+            FORECAST_URL, params=_current_params(latitude, longitude), timeout=10
+        )
+        return _parse_current_response(response)
+    except httpx.HTTPError as e:
+        st.error(f"Error fetching current weather: {str(e)}")
+        return None
+    except (KeyError, ValueError) as e:
+        st.error(f"Unexpected API response format: {str(e)}")
+        return None
+
+
+async def _fetch_historical(
+    client: httpx.AsyncClient,
+    latitude: float,
+    longitude: float,
+    years_back: int,
+    metrics: Tuple[str, ...] = HOURLY_METRICS,
+) -> Optional[pd.DataFrame]:
+    """Fetches historical climate data from ERA5 reanalysis."""
+    cached, cache_path, params = _archive_request(latitude, longitude, years_back, metrics)
+    if cached is not None:
+        return cached
+    
+    try:
+        response = await client.get(ARCHIVE_URL, params={**params, "format": "csv"})
+        as_csv = not _csv_rejected(response)
+        if not as_csv:
+            # CSV output rejected - retry with the default JSON format
+            response = await client.get(ARCHIVE_URL, params=params)
+        return _parse_archive_response(response, as_csv, cache_path, metrics)
+    except httpx.HTTPError as e:
+        st.error(f"Error fetching historical climate data: {str(e)}")
+        return None
+    except (KeyError, ValueError) as e:
+        st.error(f"Error processing historical data: {str(e)}")
+        return None
+
+
+async def _fetch_bundle(
+    latitude: float,
+    longitude: float,
+    years_back: int,
+    metrics: Tuple[str, ...],
+    transport: Optional[httpx.AsyncBaseTransport] = None,
+) -> Tuple[Optional[Dict], Optional[pd.DataFrame]]:
+    """
+    Runs both requests on one HTTP/2 client.
+    
+    transport replaces the network layer, e.g. httpx.MockTransport in tests.
+    """
+    async with httpx.AsyncClient(timeout=30, http2=True, transport=transport) as client:
+        return await asyncio.gather(
+            _fetch_current(client, latitude, longitude),
+            _fetch_historical(client, latitude, longitude, years_back, metrics),
+        )
+
+
+# Shared, not copied, across sessions: callers must not mutate the results
+@st.cache_resource(ttl=3600)
+def fetch_weather_bundle(
+    latitude: float,
+    longitude: float,
+    years_back: int = 10,
+    metrics: Tuple[str, ...] = HOURLY_METRICS,
+) -> Tuple[Optional[Dict], Optional[pd.DataFrame]]:
+    """
+    Fetches current weather and historical climate data concurrently.
+    
+    Total latency is bounded by the slower of the two requests (usually the
+    archive) instead of their sum. Coordinates are used as given; pass them
+    through snap_to_grid so nearby locations share cache entries.
+    """
+    current, historical = asyncio.run(
+        _fetch_bundle(latitude, longitude, years_back, metrics)
+    )
+    return current, historical
@@ -0,0 +1,62 @@
+"""
+Shared pytest fixtures
+"""
+
+import os
+import pytest
+import pandas as pd
+import numpy as np
+
+
+@pytest.fixture
+def rng():
+    """
+    Freshly seeded numpy Generator for each test.
+    
+    Per-test seeding keeps every test's data independent of which other
+    tests ran first (-k, ordering, xdist). Module- and session-scoped data
+    fixtures cannot use it and seed their own Generator instead.
+    """
+    return np.random.default_rng(12345)
+
+
+@pytest.fixture(scope="session")
+def historical_df(tmp_path_factory):
+    """
+    1000 hours of all four climate metrics, built once per test session.
+    
+    Under pytest-xdist the frame is written to parquet in the directory the
+    workers share, so only the first worker builds it; the rest read it back.
+    """
+    root = tmp_path_factory.getbasetemp()
+    if os.environ.get("PYTEST_XDIST_WORKER"):
+        # Per-run parent of the gw* dirs (the plain basetemp parent outlives runs)
+        root = root.parent
+    path = root / "hist.parquet"
+    if path.exists():
+        return pd.read_parquet(path)
+    
+    rng = np.random.default_rng(42)
+    dates = pd.date_range(start="2020-01-01", periods=1000, freq="h")
+    
+    # One contiguous 2-D block instead of four arrays pandas has to consolidate;
+    # copy=False wraps it as-is since nothing else holds a reference
+    values = np.empty((1000, 4), dtype=np.float32)
+    values[:, 0] = rng.normal(20, 5, 1000)
+    values[:, 1] = rng.normal(50, 10, 1000)
+    values[:, 2] = rng.standard_exponential(1000) * 2
+    values[:, 3] = rng.normal(10, 3, 1000)
+    
+    df = pd.DataFrame(
+        values,
+        columns=["temperature_2m", "relative_humidity_2m", "precipitation", "wind_speed_10m"],
+        index=dates,
+        copy=False,
+    )
+    
+    # Write-then-rename so a worker never reads a half-written file
+    tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+    df.to_parquet(tmp_path)
+    tmp_path.replace(path)
+    
+    return df
@@ -7,118 +7,257 @@ import pytest
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
-from src.analysis import calculate_z_score, detect_anomaly, analyze_climate_anomalies
+from src.analysis import (
+    calculate_z_score,
+    detect_anomaly,
+    analyze_climate_anomalies,
+    compute_seasonal_stats,
+    seasonal_z_score,
+    severity_levels,
+)
+from src import _fast, analysis
+from src._fast import _seasonal_mean_std_loop, _seasonal_mean_std_numpy, seasonal_mean_std
 
 
-def test_calculate_z_score_basic():
+# Shared hourly index (DatetimeIndex is immutable, so reuse is safe)
+_DATES_100 = pd.date_range(start="2020-01-01", periods=100, freq="h")
+
+# Shared "now" values for the seasonal lookups
+CURRENT_TIME = datetime(2024, 1, 1, 12, 0)
+JAN_TIME = datetime(2024, 1, 15, 12, 0)
+JUL_TIME = datetime(2024, 7, 15, 12, 0)
+
+_CURRENT_WEATHER_MINIMAL = {"temperature": 25.0}
+
+# Keys every analyze_climate_anomalies result entry must have
+REQUIRED = frozenset({"current", "mean", "std_dev", "z_score", "is_anomaly", "severity"})
+
+
+class _FrozenDatetime(datetime):
+    """datetime whose now() always returns JAN_TIME"""
+    
+    @classmethod
+    def now(cls, tz=None):
+        return JAN_TIME
+
+
+# Every seasonal_mean_std backend: the numpy fallback, the plain-Python loop
+# numba compiles, and the compiled kernel itself when numba is installed
+_SEASONAL_BACKENDS = [_seasonal_mean_std_numpy, _seasonal_mean_std_loop]
+if seasonal_mean_std is not _seasonal_mean_std_numpy:
+    _SEASONAL_BACKENDS.append(seasonal_mean_std)
+
+
+@pytest.fixture(
+    params=_SEASONAL_BACKENDS, ids=["numpy", "loop", "compiled"][: len(_SEASONAL_BACKENDS)]
+)
+def seasonal_backend(request, monkeypatch):
+    """Routes calculate_z_score through each seasonal_mean_std backend in turn"""
+    monkeypatch.setattr(_fast, "seasonal_mean_std", request.param)
+    return request.param
+
+
+@pytest.fixture(scope="module")
+def seasonal_history():
+    """Midnight and noon values with mean 10 in January and 30 in July"""
+    rng = np.random.default_rng(0)
+    # 15 days from each season is enough to exercise the month/hour lookup
+    dates = pd.DatetimeIndex(
+        [datetime(2020, m, d, h) for m in (1, 4, 7, 10) for d in range(1, 16) for h in (0, 12)]
+    )
+    
+    # January values: mean=10, July values: mean=30, other months: mean=20
+    # Each group is drawn straight into its slots of one preallocated buffer
+    months = np.asarray(dates.month, dtype=np.int8)
+    jan = months == 1
+    jul = months == 7
+    other = ~(jan | jul)
+    values = np.empty(len(dates), dtype=np.float32)
+    values[jan] = rng.normal(10, 2, np.count_nonzero(jan))
+    values[jul] = rng.normal(30, 2, np.count_nonzero(jul))
+    values[other] = rng.normal(20, 2, np.count_nonzero(other))
+    
+    return pd.Series(values, index=dates, copy=False)
+
+
+@pytest.fixture(scope="module")
+def historical_by_month(seasonal_history):
+    """seasonal_history pre-split by calendar month, built once per module"""
+    months = seasonal_history.index.month
+    return {m: seasonal_history[months == m] for m in range(1, 13)}
+
+
+def test_calculate_z_score_basic(rng, seasonal_backend):
     """Test basic Z-score calculation"""
-    # Create simple historical data
-    dates = pd.date_range(start="2020-01-01", periods=100, freq="H")
-    values = np.random.normal(20, 5, 100)  # Mean=20, Std=5
-    historical = pd.Series(values, index=dates)
+    # 31 January noons, so every sample falls in the current month/hour slot
+    dates = pd.date_range(start="2020-01-01 12:00", periods=31, freq="D")
+    # float32 like the archive data from the API client; mean=20, std=5
+    values = rng.standard_normal(31, dtype=np.float32) * 5 + 20
+    historical = pd.Series(values, index=dates, copy=False)
     
     current_value = 30.0
-    current_time = datetime(2024, 1, 1, 12, 0)
+    z_score, mean, std_dev = calculate_z_score(current_value, historical, CURRENT_TIME)
     
-    z_score, mean, std_dev = calculate_z_score(current_value, historical, current_time)
+    expected = values.astype(np.float64)
+    expected_mean = expected.mean()
+    expected_std = expected.std(ddof=1)
     
-    # Z-score should be approximately (30-20)/5 = 2.0
-    assert abs(z_score - 2.0) < 1.0  # Allow some variance due to random data
-    assert abs(mean - 20.0) < 2.0
-    assert abs(std_dev - 5.0) < 2.0
+    np.testing.assert_allclose(mean, expected_mean, rtol=1e-12)
+    np.testing.assert_allclose(std_dev, expected_std, rtol=1e-12)
+    np.testing.assert_allclose(z_score, (current_value - expected_mean) / expected_std, rtol=1e-12)
 
 
-def test_calculate_z_score_seasonal_filtering():
+def test_calculate_z_score_seasonal_filtering(seasonal_history, seasonal_backend):
     """Test that seasonal filtering works correctly"""
-    # Create data with clear monthly pattern
-    dates = pd.date_range(start="2020-01-01", periods=365 * 2, freq="H")
-    
-    # January values: mean=10, July values: mean=30
-    values = []
-    for date in dates:
-        if date.month == 1:
-            values.append(np.random.normal(10, 2))
-        elif date.month == 7:
-            values.append(np.random.normal(30, 2))
-        else:
-            values.append(np.random.normal(20, 2))
-    
-    historical = pd.Series(values, index=dates)
+    historical = seasonal_history
+    months = historical.index.month
+    noon = historical.index.hour == 12
     
     # Test January (should use January data)
-    jan_time = datetime(2024, 1, 15, 12, 0)
-    z_score_jan, mean_jan, _ = calculate_z_score(15.0, historical, jan_time)
+    z_score_jan, mean_jan, _ = calculate_z_score(15.0, historical, JAN_TIME)
     
     # Test July (should use July data)
-    jul_time = datetime(2024, 7, 15, 12, 0)
-    z_score_jul, mean_jul, _ = calculate_z_score(35.0, historical, jul_time)
+    z_score_jul, mean_jul, _ = calculate_z_score(35.0, historical, JUL_TIME)
     
-    # January mean should be closer to 10, July mean closer to 30
+    # January mean comes from January noons only, July mean from July noons
     assert mean_jan < mean_jul
-    assert abs(mean_jan - 10.0) < 3.0
-    assert abs(mean_jul - 30.0) < 3.0
+    expected_jan = historical[(months == 1) & noon].to_numpy(np.float64).mean()
+    expected_jul = historical[(months == 7) & noon].to_numpy(np.float64).mean()
+    np.testing.assert_allclose(mean_jan, expected_jan, rtol=1e-12)
+    np.testing.assert_allclose(mean_jul, expected_jul, rtol=1e-12)
+
+
+def test_calculate_z_score_by_month_matches_full_history(seasonal_history, historical_by_month):
+    """Test that scoring a pre-split month gives the same result as the full history"""
+    for current_time in [JAN_TIME, datetime(2024, 7, 15, 0, 0)]:
+        expected = calculate_z_score(25.0, seasonal_history, current_time)
+        result = calculate_z_score(25.0, historical_by_month[current_time.month], current_time)
+        np.testing.assert_allclose(result, expected, rtol=1e-12)
 
 
 def test_calculate_z_score_empty_data():
     """Test handling of empty historical data"""
     empty_series = pd.Series([], dtype=float)
-    current_time = datetime(2024, 1, 1, 12, 0)
-    
-    z_score, mean, std_dev = calculate_z_score(20.0, empty_series, current_time)
+    z_score, mean, std_dev = calculate_z_score(20.0, empty_series, CURRENT_TIME)
     
     assert z_score == 0.0
     assert mean == 0.0
     assert std_dev == 0.0
 
 
+def test_calculate_z_score_ignores_missing_values():
+    """Test that NaN values are skipped and all-NaN data gives zeros"""
+    dates = pd.date_range(start="2020-01-01", periods=6, freq="D") + pd.Timedelta(hours=12)
+    historical = pd.Series([10.0, np.nan, 20.0, np.nan, 30.0, np.nan], index=dates)
+    z_score, mean, std_dev = calculate_z_score(30.0, historical, CURRENT_TIME)
+    
+    assert np.isclose(mean, 20.0)
+    assert np.isclose(std_dev, 10.0)
+    assert np.isclose(z_score, 1.0)
+    
+    all_missing = pd.Series(np.nan, index=dates)
+    assert calculate_z_score(30.0, all_missing, CURRENT_TIME) == (0.0, 0.0, 0.0)
+
+
+def test_seasonal_mean_std_matches_reference(rng, seasonal_backend):
+    """Test each seasonal mean/std backend against a float64 boolean-mask reference"""
+    dates = pd.date_range(start="2020-01-01", periods=24 * 90, freq="h")
+    values = rng.normal(20, 5, len(dates)).astype(np.float32)
+    values[::7] = np.nan
+    months = np.asarray(dates.month, dtype=np.int8)
+    hours = np.asarray(dates.hour, dtype=np.int8)
+    
+    # (7, 0) has no rows at all in these 90 days
+    for month, hour in [(1, 12), (2, -1), (-1, -1), (7, 0)]:
+        mask = ((months == month) | (month < 0)) & ((hours == hour) | (hour < 0))
+        selected = values[mask].astype(np.float64)
+        valid = selected[~np.isnan(selected)]
+        
+        mean, std_dev, n_valid, n_rows = seasonal_backend(values, months, hours, month, hour)
+        
+        assert (n_valid, n_rows) == (valid.size, selected.size)
+        if valid.size:
+            np.testing.assert_allclose(mean, valid.mean(), rtol=1e-12)
+            np.testing.assert_allclose(std_dev, valid.std(ddof=1), rtol=1e-12)
+        else:
+            assert (mean, std_dev) == (0.0, 0.0)
+
+
 def test_calculate_z_score_zero_std_dev():
     """Test handling of zero standard deviation"""
-    dates = pd.date_range(start="2020-01-01", periods=10, freq="H")
-    values = [20.0] * 10  # All same value
-    historical = pd.Series(values, index=dates)
-    
-    current_time = datetime(2024, 1, 1, 12, 0)
-    z_score, mean, std_dev = calculate_z_score(25.0, historical, current_time)
+    # All same value; a plain array plus its datetime64 index skips the Series
+    z_score, mean, std_dev = calculate_z_score(
+        25.0, np.full(10, 20.0), CURRENT_TIME, index=_DATES_100[:10].values
+    )
     
     assert z_score == 0.0  # Should return 0 when std_dev is 0
     assert mean == 20.0
     assert std_dev == 0.0
 
 
-def test_detect_anomaly_extreme():
-    """Test detection of extreme anomalies"""
-    is_anomaly, severity = detect_anomaly(4.5, threshold=2.0)
-    assert is_anomaly is True
-    assert severity == "Extreme"
+def test_calculate_z_score_array_with_datetime_index(rng):
+    """Test that a DatetimeIndex works as the index of array historical data"""
+    values = rng.normal(20, 5, len(_DATES_100))
+    expected = calculate_z_score(25.0, pd.Series(values, index=_DATES_100), CURRENT_TIME)
     
-    is_anomaly, severity = detect_anomaly(-4.5, threshold=2.0)
-    assert is_anomaly is True
-    assert severity == "Extreme"
+    for index in (_DATES_100, _DATES_100.values):
+        result = calculate_z_score(25.0, values, CURRENT_TIME, index=index)
+        np.testing.assert_allclose(result, expected, rtol=1e-12)
 
 
-def test_detect_anomaly_moderate():
-    """Test detection of moderate anomalies"""
-    is_anomaly, severity = detect_anomaly(2.5, threshold=2.0)
-    assert is_anomaly is True
-    assert severity == "Moderate"
+def test_seasonal_z_score_matches_calculate_z_score(rng):
+    """Test that precomputed seasonal stats give the same result as filtering"""
+    dates = pd.date_range(start="2020-01-01", periods=24 * 60, freq="h")
+    values = rng.normal(20, 5, len(dates))
+    # February 06:00 has rows but no valid values
+    values[(dates.month == 2) & (dates.hour == 6)] = np.nan
+    historical_data = pd.DataFrame({"temperature_2m": values}, index=dates, copy=False)
+    stats = compute_seasonal_stats(historical_data)
+    
+    # January 12:00 has exact matches; March falls back to all data
+    for current_time in [JAN_TIME, datetime(2024, 3, 1, 6, 0), datetime(2024, 2, 1, 6, 0)]:
+        expected = calculate_z_score(
+            25.0, historical_data["temperature_2m"], current_time
+        )
+        result = seasonal_z_score(
+            25.0, stats, "temperature_2m", current_time.month, current_time.hour
+        )
+        assert np.allclose(result, expected)
     
-    is_anomaly, severity = detect_anomaly(-2.5, threshold=2.0)
-    assert is_anomaly is True
-    assert severity == "Moderate"
+    # The all-NaN slot is used as-is rather than falling back to February
+    assert seasonal_z_score(25.0, stats, "temperature_2m", 2, 6) == (0.0, 0.0, 0.0)
+
 
+@pytest.mark.parametrize(
+    "z_score,expected_anomaly,expected_severity",
+    [
+        (4.5, True, "Extreme"),
+        (-4.5, True, "Extreme"),
+        (2.5, True, "Moderate"),
+        (-2.5, True, "Moderate"),
+        (1.5, False, "Normal"),
+        (0.5, False, "Normal"),
+    ],
+)
+def test_detect_anomaly(z_score, expected_anomaly, expected_severity):
+    """Test classification into Normal, Moderate and Extreme anomalies"""
+    is_anomaly, severity = detect_anomaly(z_score, threshold=2.0)
+    assert is_anomaly is expected_anomaly
+    assert severity == expected_severity
 
-def test_detect_anomaly_normal():
-    """Test detection of normal values"""
-    is_anomaly, severity = detect_anomaly(1.5, threshold=2.0)
-    assert is_anomaly is False
-    assert severity == "Normal"
+
+def test_severity_levels_matches_detect_anomaly():
+    """Test that array classification agrees with detect_anomaly at the boundaries"""
+    z_scores = np.array([0.0, 1.99, 2.0, -2.0, 3.99, 4.0, -4.5, np.nan])
+    
+    levels = severity_levels(z_scores, threshold=2.0)
     
-    is_anomaly, severity = detect_anomaly(0.5, threshold=2.0)
-    assert is_anomaly is False
-    assert severity == "Normal"
+    assert levels.tolist() == [0, 0, 1, 1, 1, 2, 2, 0]
+    for z, level in zip(z_scores, levels):
+        assert detect_anomaly(z, threshold=2.0) == (level > 0, ["Normal", "Moderate", "Extreme"][level])
 
 
-def test_analyze_climate_anomalies():
+def test_analyze_climate_anomalies(historical_df):
     """Test full analysis pipeline"""
     # Create mock current weather
     current_weather = {
@@ -128,19 +267,7 @@ def test_analyze_climate_anomalies():
         "wind_speed": 15.0,
     }
     
-    # Create mock historical data
-    dates = pd.date_range(start="2020-01-01", periods=1000, freq="H")
-    historical_data = pd.DataFrame(
-        {
-            "temperature_2m": np.random.normal(20, 5, 1000),
-            "relative_humidity_2m": np.random.normal(50, 10, 1000),
-            "precipitation": np.random.exponential(2, 1000),
-            "wind_speed_10m": np.random.normal(10, 3, 1000),
-        },
-        index=dates,
-    )
-    
-    results = analyze_climate_anomalies(current_weather, historical_data)
+    results = analyze_climate_anomalies(current_weather, historical_df)
     
     # Check that all metrics are analyzed
     assert "temperature" in results
@@ -150,33 +277,51 @@ def test_analyze_climate_anomalies():
     
     # Check structure of results
     for metric, data in results.items():
-        assert "current" in data
-        assert "mean" in data
-        assert "std_dev" in data
-        assert "z_score" in data
-        assert "is_anomaly" in data
-        assert "severity" in data
+        assert REQUIRED <= data.keys()
 
 
-def test_analyze_climate_anomalies_empty_data():
-    """Test analysis with empty historical data"""
-    current_weather = {"temperature": 25.0}
-    empty_data = pd.DataFrame()
+def test_analyze_climate_anomalies_matches_per_metric_z_scores(rng, monkeypatch):
+    """Test that the vectorized analysis agrees with scoring each metric alone"""
+    # Pin "now" so the analysis and the expectation use the same month/hour
+    monkeypatch.setattr(analysis, "datetime", _FrozenDatetime)
+    current_weather = {"temperature": 25.0, "humidity": 60.0}
+    dates = pd.date_range(start="2020-01-01", periods=24 * 400, freq="h")
+    historical_data = pd.DataFrame(
+        {
+            "temperature_2m": rng.normal(20, 5, len(dates)),
+            "relative_humidity_2m": rng.normal(50, 10, len(dates)),
+        },
+        index=dates,
+        copy=False,
+    )
+    stats = compute_seasonal_stats(historical_data)
     
-    results = analyze_climate_anomalies(current_weather, empty_data)
+    results = analyze_climate_anomalies(current_weather, historical_data, stats)
     
-    assert results == {}
+    # calculate_z_score filters the raw series, independent of the stats tables
+    for metric, column in [("temperature", "temperature_2m"), ("humidity", "relative_humidity_2m")]:
+        z_score, mean, std_dev = calculate_z_score(
+            current_weather[metric], historical_data[column], JAN_TIME
+        )
+        np.testing.assert_allclose(results[metric]["z_score"], z_score, rtol=1e-9)
+        np.testing.assert_allclose(results[metric]["mean"], mean, rtol=1e-9)
+        np.testing.assert_allclose(results[metric]["std_dev"], std_dev, rtol=1e-9)
 
 
-def test_analyze_climate_anomalies_missing_columns():
-    """Test analysis with missing columns in historical data"""
-    current_weather = {"temperature": 25.0}
-    dates = pd.date_range(start="2020-01-01", periods=100, freq="H")
-    historical_data = pd.DataFrame(
-        {"other_column": np.random.normal(20, 5, 100)}, index=dates
-    )
-    
-    results = analyze_climate_anomalies(current_weather, historical_data)
+@pytest.mark.parametrize(
+    "historical_data,expected",
+    [
+        (pd.DataFrame(), {}),
+        (
+            pd.DataFrame({"other_column": np.full(100, 20.0)}, index=_DATES_100, copy=False),
+            {},
+        ),
+    ],
+    ids=["empty_data", "missing_columns"],
+)
+def test_analyze_climate_anomalies_without_metric_data(historical_data, expected):
+    """Test analysis with empty data or without any metric columns"""
+    results = analyze_climate_anomalies(_CURRENT_WEATHER_MINIMAL, historical_data)
     
-    # Should not crash, but temperature won't be in results
-    assert "temperature" not in results
+    # Should not crash, and no metric can be scored
+    assert results == expected
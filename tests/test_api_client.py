@@ -0,0 +1,165 @@
+"""
+Unit Tests for the Open-Meteo API client
+Tests response parsing and the on-disk archive cache (no network access)
+"""
+
+import json
+import os
+import time
+import numpy as np
+import pandas as pd
+from datetime import date
+from src import api_client
+from src.api_client import (
+    _archive_cache_path,
+    _archive_window,
+    _csv_rejected,
+    _load_cached_archive,
+    _parse_archive_response,
+    _parse_historical,
+    _parse_historical_csv,
+    _store_cached_archive,
+    snap_to_grid,
+)
+
+
+ARCHIVE_RESPONSE = {
+    "hourly": {
+        "time": ["2024-01-01T00:00", "2024-01-01T01:00", "2024-01-01T02:00"],
+        "temperature_2m": [1.5, 2.0, None],
+        "relative_humidity_2m": [80, 82, 85],
+        "precipitation": [0.0, 0.1, 0.0],
+        "wind_speed_10m": [10.2, 11.0, 9.8],
+    }
+}
+
+ARCHIVE_CSV = (
+    "latitude,longitude,elevation,utc_offset_seconds,timezone,timezone_abbreviation\n"
+    "40.710335,-73.99307,32.0,-18000,America/New_York,EST\n"
+    "\n"
+    "time,temperature_2m (°C),relative_humidity_2m (%),precipitation (mm),wind_speed_10m (km/h)\n"
+    "2024-01-01T00:00,1.5,80,0.00,10.2\n"
+    "2024-01-01T01:00,2.0,82,0.10,11.0\n"
+    "2024-01-01T02:00,,85,0.00,9.8\n"
+).encode()
+
+
+class _Response:
+    """Just enough of a requests/httpx response for the parse helpers"""
+    
+    def __init__(self, status_code, content=b""):
+        self.status_code = status_code
+        self.content = content
+    
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise ValueError(f"HTTP {self.status_code}")
+
+
+def test_snap_to_grid():
+    """Test that coordinates round to the 0.25 degree ERA5 grid"""
+    assert snap_to_grid(40.7128) == 40.75
+    assert snap_to_grid(40.7831) == 40.75
+    assert snap_to_grid(-74.006) == -74.0
+    assert snap_to_grid(-73.87) == -73.75
+
+
+def test_archive_window_is_whole_days():
+    """Test that the archive window ends yesterday and spans whole years"""
+    assert _archive_window(10, today=date(2024, 6, 15)) == (
+        date(2014, 6, 14),
+        date(2024, 6, 14),
+    )
+
+
+def test_archive_window_leap_day():
+    """Test that a window ending on Feb 29 starts on Feb 28"""
+    assert _archive_window(1, today=date(2024, 3, 1)) == (
+        date(2023, 2, 28),
+        date(2024, 2, 29),
+    )
+
+
+def test_parse_historical():
+    """Test that archive responses become a time-indexed DataFrame"""
+    df = _parse_historical(ARCHIVE_RESPONSE)
+    
+    assert isinstance(df.index, pd.DatetimeIndex)
+    assert len(df) == 3
+    assert df.index[1] == pd.Timestamp("2024-01-01 01:00")
+    assert df["temperature_2m"].isna().sum() == 1
+    assert (df.drop(columns=["_month", "_hour", "_month_hour"]).dtypes == np.float32).all()
+    assert df["_hour"].tolist() == [0, 1, 2]
+    assert df["_month"].dtype == np.int8
+    assert df["_month_hour"].tolist() == [100, 101, 102]
+
+
+def test_parse_historical_missing_hourly():
+    """Test handling of a response without hourly data"""
+    assert _parse_historical({}) is None
+
+
+def test_parse_historical_subset_of_metrics():
+    """Test that only the requested metrics become columns"""
+    df = _parse_historical(ARCHIVE_RESPONSE, ("temperature_2m", "relative_humidity_2m"))
+    
+    assert list(df.columns)[:2] == ["temperature_2m", "relative_humidity_2m"]
+    assert "precipitation" not in df.columns
+
+
+def test_parse_historical_csv_matches_json():
+    """Test that CSV and JSON archive responses give the same DataFrame"""
+    pd.testing.assert_frame_equal(
+        _parse_historical_csv(ARCHIVE_CSV), _parse_historical(ARCHIVE_RESPONSE)
+    )
+
+
+def test_archive_cache_round_trip(tmp_path, monkeypatch):
+    """Test that a stored archive is read back unchanged"""
+    monkeypatch.setattr(api_client, "CACHE_DIR", tmp_path)
+    df = _parse_historical(ARCHIVE_RESPONSE)
+    path = _archive_cache_path(40.7128, -74.006, 10)
+    
+    assert _load_cached_archive(path) is None
+    
+    _store_cached_archive(df, path)
+    
+    pd.testing.assert_frame_equal(_load_cached_archive(path), df)
+    assert list(tmp_path.glob("*.tmp")) == []
+
+
+def test_archive_cache_expired(tmp_path, monkeypatch):
+    """Test that archives older than the TTL are ignored"""
+    monkeypatch.setattr(api_client, "CACHE_DIR", tmp_path)
+    df = _parse_historical(ARCHIVE_RESPONSE)
+    path = _archive_cache_path(40.7128, -74.006, 10)
+    _store_cached_archive(df, path)
+    
+    stale = time.time() - api_client.ARCHIVE_CACHE_TTL - 60
+    os.utime(path, (stale, stale))
+    
+    assert _load_cached_archive(path) is None
+    assert not path.exists()
+
+
+def test_parse_archive_response_caches_csv_and_json(tmp_path):
+    """Test that both archive formats are parsed alike and written to the cache"""
+    json_path = tmp_path / "json.parquet"
+    csv_path = tmp_path / "csv.parquet"
+    
+    from_json = _parse_archive_response(
+        _Response(200, json.dumps(ARCHIVE_RESPONSE).encode()), False, json_path
+    )
+    from_csv = _parse_archive_response(_Response(200, ARCHIVE_CSV), True, csv_path)
+    
+    pd.testing.assert_frame_equal(from_csv, from_json)
+    pd.testing.assert_frame_equal(_load_cached_archive(csv_path), from_csv)
+    assert json_path.exists()
+
+
+def test_csv_rejected_only_on_client_errors():
+    """Test that only 4xx responses trigger the JSON retry"""
+    assert _csv_rejected(_Response(400))
+    assert _csv_rejected(_Response(422))
+    assert not _csv_rejected(_Response(200))
+    assert not _csv_rejected(_Response(503))
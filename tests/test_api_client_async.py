@@ -0,0 +1,174 @@
+"""
+Unit Tests for the concurrent Open-Meteo client
+Tests fetch_weather_bundle against httpx.MockTransport (no network access)
+"""
+
+import functools
+import httpx
+import pandas as pd
+import pytest
+from src import api_client, api_client_async
+from src.api_client import _archive_cache_path, _parse_historical_csv, _store_cached_archive
+from src.api_client_async import fetch_weather_bundle
+
+
+FORECAST_RESPONSE = {
+    "current": {
+        "time": "2024-01-01T12:00",
+        "temperature_2m": 3.5,
+        "relative_humidity_2m": 81,
+        "precipitation": 0.2,
+        "wind_speed_10m": 12.4,
+    }
+}
+
+ARCHIVE_RESPONSE = {
+    "hourly": {
+        "time": ["2024-01-01T00:00", "2024-01-01T01:00"],
+        "temperature_2m": [1.5, 2.0],
+        "relative_humidity_2m": [80, 82],
+        "precipitation": [0.0, 0.1],
+        "wind_speed_10m": [10.2, 11.0],
+    }
+}
+
+ARCHIVE_CSV = (
+    "latitude,longitude,elevation,utc_offset_seconds,timezone,timezone_abbreviation\n"
+    "40.75,-74.0,32.0,-18000,America/New_York,EST\n"
+    "\n"
+    "time,temperature_2m (°C),relative_humidity_2m (%),precipitation (mm),wind_speed_10m (km/h)\n"
+    "2024-01-01T00:00,1.5,80,0.00,10.2\n"
+    "2024-01-01T01:00,2.0,82,0.10,11.0\n"
+).encode()
+
+
+class _ErrorLog:
+    """Stands in for st so tests can see what st.error would show"""
+    
+    def __init__(self):
+        self.messages = []
+    
+    def error(self, message):
+        self.messages.append(message)
+
+
+@pytest.fixture
+def errors(monkeypatch):
+    """Messages passed to st.error by the async client"""
+    log = _ErrorLog()
+    monkeypatch.setattr(api_client_async, "st", log)
+    return log.messages
+
+
+@pytest.fixture
+def requests_seen(tmp_path, monkeypatch):
+    """
+    Routes fetch_weather_bundle through a MockTransport and an empty cache.
+    
+    Returns a function that installs a handler; every request it receives
+    is appended to the returned list.
+    """
+    monkeypatch.setattr(api_client, "CACHE_DIR", tmp_path)
+    # Real streamlit keeps results in memory across tests
+    if hasattr(fetch_weather_bundle, "clear"):
+        fetch_weather_bundle.clear()
+    seen = []
+    
+    def install(handler):
+        def record(request):
+            seen.append(request)
+            return handler(request)
+        
+        monkeypatch.setattr(
+            api_client_async,
+            "_fetch_bundle",
+            functools.partial(
+                api_client_async._fetch_bundle, transport=httpx.MockTransport(record)
+            ),
+        )
+        return seen
+    
+    return install
+
+
+def _open_meteo(request):
+    """Answers both endpoints like the real API"""
+    if request.url.host == "api.open-meteo.com":
+        return httpx.Response(200, json=FORECAST_RESPONSE)
+    return httpx.Response(200, content=ARCHIVE_CSV)
+
+
+def test_fetch_weather_bundle_returns_both(requests_seen):
+    """Test that current conditions and the archive come back together"""
+    seen = requests_seen(_open_meteo)
+    
+    current, historical = fetch_weather_bundle(40.75, -74.0, years_back=1)
+    
+    assert current["temperature"] == 3.5
+    assert current["timestamp"] == "2024-01-01T12:00"
+    pd.testing.assert_frame_equal(historical, _parse_historical_csv(ARCHIVE_CSV))
+    archive = [r for r in seen if r.url.host == "archive-api.open-meteo.com"]
+    assert len(seen) == 2
+    assert archive[0].url.params["format"] == "csv"
+
+
+def test_fetch_weather_bundle_forecast_error(requests_seen, errors):
+    """Test that a failed forecast request still returns the archive"""
+    def handler(request):
+        if request.url.host == "api.open-meteo.com":
+            return httpx.Response(503)
+        return _open_meteo(request)
+    
+    requests_seen(handler)
+    
+    current, historical = fetch_weather_bundle(40.75, -74.0, years_back=1)
+    
+    assert current is None
+    assert len(historical) == 2
+    assert errors[0].startswith("Error fetching current weather")
+
+
+def test_fetch_weather_bundle_cache_hit_skips_archive(requests_seen):
+    """Test that a cached archive is returned without an archive request"""
+    cached = _parse_historical_csv(ARCHIVE_CSV)
+    _store_cached_archive(cached, _archive_cache_path(40.75, -74.0, 1))
+    seen = requests_seen(_open_meteo)
+    
+    _, historical = fetch_weather_bundle(40.75, -74.0, years_back=1)
+    
+    pd.testing.assert_frame_equal(historical, cached)
+    assert [r.url.host for r in seen] == ["api.open-meteo.com"]
+
+
+def test_fetch_weather_bundle_falls_back_to_json(requests_seen):
+    """Test that a rejected CSV request is retried as JSON"""
+    def handler(request):
+        if request.url.params.get("format") == "csv":
+            return httpx.Response(400, json={"error": True, "reason": "csv"})
+        if request.url.host == "archive-api.open-meteo.com":
+            return httpx.Response(200, json=ARCHIVE_RESPONSE)
+        return _open_meteo(request)
+    
+    seen = requests_seen(handler)
+    
+    _, historical = fetch_weather_bundle(40.75, -74.0, years_back=1)
+    
+    pd.testing.assert_frame_equal(historical, _parse_historical_csv(ARCHIVE_CSV))
+    archive = [r for r in seen if r.url.host == "archive-api.open-meteo.com"]
+    assert [r.url.params.get("format") for r in archive] == ["csv", None]
+
+
+def test_fetch_weather_bundle_archive_rejected(requests_seen, errors):
+    """Test that an archive rejected in both formats gives None and an error"""
+    def handler(request):
+        if request.url.host == "archive-api.open-meteo.com":
+            return httpx.Response(400, json={"error": True})
+        return _open_meteo(request)
+    
+    requests_seen(handler)
+    
+    current, historical = fetch_weather_bundle(40.75, -74.0, years_back=1)
+    
+    assert current is not None
+    assert historical is None
+    assert errors[0].startswith("Error fetching historical climate data")